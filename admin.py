@@ -1,23 +1,80 @@
-from flask import url_for, redirect, request
+from flask import g, url_for, redirect, request
 from flask_admin import Admin
 from flask_admin.contrib.sqla import ModelView
+from sqlalchemy import inspect
 
 from .models import db
 from .models import User, Instructor, Student
 from .models import Course, Assignment, Question, QuestionDependency, QuestionFile
 from .models import Submission, Upload, Result, ResultDependency
 
-from .routes import get_context
+from .cache import cache, home_cache_key
+from .context import get_context, invalidate_membership
 
 admin = Admin(url='/dbadmin')
 
 
+def affected_memberships(model):
+    '''Get the (user ID, course ID) pairs whose membership a model may change.
+
+    This includes the old values of changed attributes, so it must be called
+    before the changes are committed.
+    '''
+    state = inspect(model)
+    if isinstance(model, (Instructor, Student)):
+        user_ids = state.attrs.user_id.load_history().sum()
+        course_ids = state.attrs.course_id.load_history().sum()
+        pairs = {(user_id, course_id) for user_id in user_ids for course_id in course_ids}
+    elif isinstance(model, User):
+        courses = (
+            list(state.attrs.courses_teaching.load_history().sum())
+            + list(state.attrs.courses_taking.load_history().sum())
+        )
+        pairs = {(model.id, course.id) for course in courses}
+    elif isinstance(model, Course):
+        users = (
+            list(state.attrs.instructors.load_history().sum())
+            + list(state.attrs.students.load_history().sum())
+        )
+        pairs = {(user.id, model.id) for user in users}
+    else:
+        pairs = set()
+    # new users and courses have no cached memberships
+    return {pair for pair in pairs if None not in pair}
+
+
 class DemograderModelView(ModelView):
 
     def is_accessible(self):
         context = get_context()
         return context['user'] and context['user'].admin
 
+    def on_model_change(self, form, model, is_created):
+        g.affected_memberships = affected_memberships(model)
+
+    def after_model_change(self, form, model, is_created):
+        self._invalidate_membership()
+        self._invalidate_home(model)
+
+    def on_model_delete(self, model):
+        g.affected_memberships = affected_memberships(model)
+
+    def after_model_delete(self, model):
+        self._invalidate_membership()
+        self._invalidate_home(model)
+
+    @staticmethod
+    def _invalidate_membership():
+        # invalidate after the commit, so the old membership is not re-cached
+        for user_id, course_id in g.pop('affected_memberships', ()):
+            invalidate_membership(user_id, course_id)
+
+    @staticmethod
+    def _invalidate_home(model):
+        # the cached home page depends on the user's admin and faculty flags
+        if isinstance(model, User):
+            cache.delete(home_cache_key(model.id))
+
     def inaccessible_callback(self, name, **kwargs):
         # redirect to login page if user doesn't have access
         return redirect(url_for('login', next=request.url))
@@ -4,6 +4,7 @@ from flask import Flask
 
 from .admin import admin
 from .auth import oauth, blueprint as auth_blueprint
+from .cache import cache
 from .models import db
 from .routes import blueprint as routes_blueprint
 
@@ -21,6 +22,7 @@ def create_app():
     app.secret_key = app.config['FLASK_SECRET_KEY']
     # initialize extensions
     db.init_app(app)
+    cache.init_app(app)
     admin.init_app(app)
     oauth.init_app(app)
     oauth.register(
@@ -43,10 +43,12 @@ def login_redirect():
         db.session.add(user)
         db.session.commit()
     session['user_email'] = user_email
+    session['user_id'] = user.id
     return redirect('/')
 
 
 @blueprint.route('/logout')
 def logout():
     session.pop('user_email')
+    session.pop('user_id', None)
     return redirect('/')
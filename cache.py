@@ -0,0 +1,10 @@
+from flask import session
+from flask_caching import Cache
+
+cache = Cache()
+
+
+def home_cache_key(user_id=None):
+    if user_id is None:
+        user_id = session.get('user_id')
+    return f'home:{user_id}'
@@ -1,8 +1,10 @@
 from enum import IntEnum
 
-from flask import session, request, abort
+from flask import current_app, g, session, request, abort
+from sqlalchemy.orm import load_only
 
-from .models import User, Course
+from .cache import cache
+from .models import db, User, Course
 
 
 class Role(IntEnum):
@@ -16,75 +18,74 @@ class Role(IntEnum):
     ADMIN = 3
 
 
-def forbidden(context):
-    if not context['user'].admin:
+# the User columns used by contexts and templates; others are loaded on access
+_USER_COLUMNS = load_only(
+    User.id,
+    User.email,
+    User.admin,
+    User.faculty,
+    User.preferred_name,
+    User.family_name,
+)
+
+_ROLE_BY_NAME = {name.lower(): role for name, role in Role.__members__.items()}
+
+
+def forbidden(user):
+    if not user.admin:
         abort(403)
 
 
-def _set_user_context(context, url_args, **kwargs):
-    context['user'] = User.query.filter_by(email=session.get('user_email')).first()
+def get_user():
+    '''Get the logged in user.
 
+    The user is cached on flask.g, so repeated calls within the same request
+    do not query the database again. The lookup is by primary key, which
+    allows SQLAlchemy to use its identity map instead of issuing a query.
+    Sessions from before the ID was stored are looked up by email once, and
+    the ID is then added to the session.
+    '''
+    if 'user' not in g:
+        user_id = session.get('user_id')
+        if user_id is not None:
+            g.user = db.session.get(User, user_id, options=[_USER_COLUMNS])
+        elif 'user_email' in session:
+            g.user = User.query.options(_USER_COLUMNS).filter_by(email=session['user_email']).first()
+            if g.user:
+                session['user_id'] = g.user.id
+        else:
+            g.user = None
+    return g.user
 
-def _set_viewer_context(context, url_args, **kwargs):
-    if 'viewer' in url_args:
-        context['viewer'] = User.query.filter_by(email=url_args['viewer']).first()
-    if not context.get('viewer', None):
-        context['viewer'] = context['user']
-    context['alternate_view'] = (context['user'] != context['viewer'])
 
+def _query_membership(user_id, course_id):
+    return db.session.get(User, user_id).role_in(db.session.get(Course, course_id))
 
-def _set_course_context(context, url_args, **kwargs):
-    # TODO determine question, assignment, and course
-    if 'course_id' in kwargs:
-        context['course'] = Course.query.filter_by(id=kwargs['course_id']).first()
-    elif False:
-        # FIXME get the course based on the assignment
-        pass
-    else:
-        context['course'] = None
 
+@cache.memoize(timeout=60)
+def _cached_membership(user_id, course_id):
+    return _query_membership(user_id, course_id)
 
-def _set_instructor_context(context, url_args, **kwargs):
-    if context['viewer'].admin:
-        context['instructor'] = True
-    elif context.get('course', None):
-        context['instructor'] = context['viewer'].teaching(context['course'])
-    else:
-        context['instructor'] = False
 
+def get_membership(user_id, course_id):
+    '''Get whether a user is teaching and/or taking a course.
 
-def _set_student_context(context, url_args, **kwargs):
-    if context.get('course', None):
-        context['student'] = context['viewer'].taking(context['course'])
-    else:
-        context['student'] = False
-
-
-def _set_role_context(context, url_args, **kwargs):
-    context['Role'] = Role # this allows templates to branch on role
-    if 'role' in url_args and url_args['role'].upper() not in Role.__members__:
-        del url_args['role']
-    if context['viewer'].admin:
-        context['role'] = min(
-            Role[url_args.get('role', 'admin').upper()],
-            Role.ADMIN,
-        )
-        context['alternate_view'] = context['alternate_view'] or (context['role'] != Role.ADMIN)
-    elif context['viewer'].faculty:
-        context['role'] = min(
-            Role[url_args.get('role', 'faculty').upper()],
-            Role.FACULTY,
-        )
-        context['alternate_view'] = context['alternate_view'] or (context['role'] != Role.FACULTY)
-    elif context['instructor']:
-        context['role'] = min(
-            Role[url_args.get('role', 'instructor').upper()],
-            Role.INSTRUCTOR,
-        )
-        context['alternate_view'] = context['alternate_view'] or (context['role'] != Role.INSTRUCTOR)
-    else:
-        context['role'] = Role.STUDENT
-        context['alternate_view'] = context['alternate_view'] or (context['role'] != Role.STUDENT)
+    The result decides access, so it is only cached if CACHE_MEMBERSHIP is
+    set, ie. if the cache is shared between workers and can be invalidated
+    with invalidate_membership().
+
+    Returns:
+        Tuple[bool, bool]: Whether the user is teaching and taking the course.
+    '''
+    if current_app.config['CACHE_MEMBERSHIP']:
+        return _cached_membership(user_id, course_id)
+    return _query_membership(user_id, course_id)
+
+
+def invalidate_membership(user_id, course_id):
+    '''Invalidate the cached membership of a user in a course.'''
+    if current_app.config['CACHE_MEMBERSHIP']:
+        cache.delete_memoized(_cached_membership, user_id, course_id)
 
 
 def get_context(**kwargs):
@@ -120,40 +121,89 @@ def get_context(**kwargs):
         min_role (Role): The minimum role the viewer must have.
     '''
     # get URL parameters
-    url_args = request.args.to_dict()
-    context = {}
-    _set_user_context(context, url_args, **kwargs)
+    url_args = request.args
+    # determine the user
+    user = get_user()
     # check if login is required
     if not kwargs.get('login_required', True):
-        return context
-    if not context['user']:
+        return {'user': user}
+    if not user:
         abort(401)
-    user = context['user']
     # check if the user is the specific user required
-    if 'user' in kwargs and kwargs['user'] != user.id:
-        forbidden(context)
-    _set_viewer_context(context, url_args, **kwargs)
-    viewer = context['viewer']
+    if not user.admin and 'user' in kwargs and kwargs['user'] != user.id:
+        abort(403)
+    # determine the viewer; only look them up if they are not the user
+    viewer = None
+    viewer_email = url_args.get('viewer')
+    if viewer_email and viewer_email != user.email:
+        viewer = User.query.options(_USER_COLUMNS).filter_by(email=viewer_email).first()
+    if not viewer:
+        viewer = user
+    alternate_view = (user != viewer)
     # check if the viewer is in a course taught by the user
-    if context['alternate_view']:
+    if alternate_view:
         viewer_is_student = user.courses_with_student(viewer).first()
         viewer_is_instructor = user.courses_with_coinstructor(viewer).first()
         if not (viewer_is_student or viewer_is_instructor):
-            forbidden(context)
-    _set_course_context(context, url_args, **kwargs)
-    course = context['course']
+            forbidden(user)
+    # determine the course
+    # TODO determine question, assignment, and course
+    if 'course_id' in kwargs:
+        course = db.session.get(Course, kwargs['course_id'])
+    elif False:
+        # FIXME get the course based on the assignment
+        pass
+    else:
+        course = None
+    # determine the viewer's membership in the course
+    if course:
+        instructor, student = get_membership(viewer.id, course.id)
+    else:
+        instructor, student = False, False
+    instructor = viewer.admin or instructor
     # check if both the user and the viewer are related to the course
     if course:
-        _set_instructor_context(context, url_args, **kwargs)
-        _set_student_context(context, url_args, **kwargs)
         # check if the user is related to the course
-        if not (user.teaching(course) or user.taking(course)):
-            forbidden(context)
+        # if the user is the viewer, their membership is already known
+        if alternate_view:
+            user_is_related = any(get_membership(user.id, course.id))
+        else:
+            user_is_related = instructor or student
+        if not user_is_related:
+            forbidden(user)
         # check if the viewer is related to the course
-        if context['alternate_view'] and not (context['instructor'] or context['student']):
-            forbidden(context)
-    _set_role_context(context, url_args, **kwargs)
+        if alternate_view and not (instructor or student):
+            forbidden(user)
+    # determine the role
+    if viewer.admin:
+        ceiling = Role.ADMIN
+    elif viewer.faculty:
+        ceiling = Role.FACULTY
+    elif instructor:
+        ceiling = Role.INSTRUCTOR
+    else:
+        ceiling = Role.STUDENT
+    role_name = url_args.get('role')
+    if role_name:
+        requested = _ROLE_BY_NAME.get(role_name.lower())
+    else:
+        requested = None
+    # Role.STUDENT is falsy, so compare against None to allow requesting it
+    if requested is None or requested > ceiling:
+        role = ceiling
+    else:
+        role = requested
+    alternate_view = alternate_view or (role != ceiling)
     # check if the viewer meets the minimum role requirements
-    if Role[kwargs.get('min_role', 'student').upper()] > context['role']:
-        forbidden(context)
-    return context
+    if kwargs.get('min_role', Role.STUDENT) > role:
+        forbidden(user)
+    return {
+        'user': user,
+        'viewer': viewer,
+        'alternate_view': alternate_view,
+        'course': course,
+        'instructor': instructor,
+        'student': student,
+        'Role': Role, # this allows templates to branch on role
+        'role': role,
+    }
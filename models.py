@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import exists, select
 from sqlalchemy.orm import validates
 
 db = SQLAlchemy()
@@ -24,10 +25,29 @@ class User(db.Model, UserMixin):
         return f'{self.preferred_name} {self.family_name}'
 
     def teaching(self, course):
-        return bool(Instructor.query.filter_by(user_id=self.id, course_id=course.id).first())
+        return db.session.query(
+            exists().where(Instructor.user_id == self.id, Instructor.course_id == course.id)
+        ).scalar()
 
     def taking(self, course):
-        return bool(Student.query.filter_by(user_id=self.id, course_id=course.id).first())
+        return db.session.query(
+            exists().where(Student.user_id == self.id, Student.course_id == course.id)
+        ).scalar()
+
+    def role_in(self, course):
+        '''Determine whether the user is teaching and/or taking a course.
+
+        This is equivalent to calling both teaching() and taking(), but only
+        uses a single query.
+
+        Returns:
+            Tuple[bool, bool]: Whether the user is teaching and taking the course.
+        '''
+        row = db.session.execute(select(
+            exists().where(Instructor.user_id == self.id, Instructor.course_id == course.id),
+            exists().where(Student.user_id == self.id, Student.course_id == course.id),
+        )).one()
+        return bool(row[0]), bool(row[1])
 
     def latest_submission(self, question=None):
         pass # TODO
@@ -43,10 +63,11 @@ class User(db.Model, UserMixin):
 class Instructor(db.Model):
     __tablename__ = 'instructors'
     __table_args__ = (
+        # this also indexes membership checks and lookups by user_id
         db.UniqueConstraint('user_id', 'course_id'),
     )
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False, index=True)
 
     def courses_with_student(self, user):
@@ -66,10 +87,11 @@ class Instructor(db.Model):
 class Student(db.Model):
     __tablename__ = 'students'
     __table_args__ = (
+        # this also indexes membership checks and lookups by user_id
         db.UniqueConstraint('user_id', 'course_id'),
     )
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False, index=True)
 
 
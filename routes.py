@@ -1,6 +1,8 @@
-from flask import Blueprint, render_template, url_for, redirect, abort
+from flask import Blueprint, current_app, render_template, url_for, redirect, abort, request, session
+from sqlalchemy import update
 from werkzeug.utils import secure_filename
 
+from .cache import cache, home_cache_key
 from .context import get_context, Role
 from .forms import UserForm
 from .models import db, User, Course, Assignment, Question, QuestionFile
@@ -18,14 +20,23 @@ def root():
 
 
 @blueprint.route('/home')
+@cache.cached(
+    timeout=30,
+    key_prefix=home_cache_key,
+    # viewer and role parameters change the page, and without a user ID the
+    # key would be shared between users, so don't cache either
+    unless=lambda: bool(request.args) or session.get('user_id') is None,
+)
 def home():
     context = get_context()
     if context['role'] >= Role.ADMIN:
-        context['users'] = User.query.all()
-        context['courses'] = Course.query.all()
-        context['assignments'] = Assignment.query.all()
-        context['questions'] = Question.query.all()
-        context['question_files'] = QuestionFile.query.all()
+        # the DB dump scans every table, so only do it when debugging
+        if current_app.debug:
+            context['users'] = User.query.all()
+            context['courses'] = Course.query.all()
+            context['assignments'] = Assignment.query.all()
+            context['questions'] = Question.query.all()
+            context['question_files'] = QuestionFile.query.all()
         return render_template('home-admin.html', **context)
     else:
         return render_template('home.html', **context)
@@ -89,16 +100,20 @@ def user_form(user_id):
         if form.id.data:
             # if there is an ID, this is editing an existing User
             # make sure that the submitted ID is the same as the user ID
-            if not (context['user'].admin or int(form.id.data) == user_id):
+            edited_id = int(form.id.data)
+            if not (context['user'].admin or edited_id == user_id):
                 abort(403)
-            user = User.query.get(form.id.data).first()
-            user.preferred_name = form.preferred_name.data.strip()
-            user.family_name = form.family_name.data.strip()
+            values = {
+                'preferred_name': form.preferred_name.data.strip(),
+                'family_name': form.family_name.data.strip(),
+            }
             # only an admin can change the email or the admin/faculty statuses
             if context['user'].admin:
-                user.email = form.email.data.strip()
-                user.admin = form.admin.data
-                user.faculty = form.faculty.data
+                values['email'] = form.email.data.strip()
+                values['admin'] = form.admin.data
+                values['faculty'] = form.faculty.data
+            # update the User directly, without loading it first
+            db.session.execute(update(User).where(User.id == edited_id).values(**values))
         else:
             # otherwise, this is creating a new User
             user = User(
@@ -108,13 +123,16 @@ def user_form(user_id):
                 admin=form.admin.data,
                 faculty=form.faculty.data,
             )
-        db.session.add(user)
+            db.session.add(user)
+            edited_id = None
         db.session.commit()
+        if edited_id is not None:
+            cache.delete(home_cache_key(edited_id))
         return redirect(url_for('demograder.home')) # FIXME
     # the form is not being submitted
     if user_id is not None:
         # a user ID is provided; set the defaults to the user being edited
-        user = User.query.get(user_id).first()
+        user = db.session.get(User, user_id)
         form.id.default = user.id
         form.preferred_name.default = user.preferred_name
         form.family_name.default = user.family_name
@@ -4,8 +4,27 @@ import pathlib
 APP_PATH = pathlib.Path(__file__).expanduser().resolve().parent
 
 SQLALCHEMY_DATABASE_PATH = str(APP_PATH / 'database.sqlite')
-SQLALCHEMY_DATABASE_URI = 'sqlite:///' + SQLALCHEMY_DATABASE_PATH
+SQLALCHEMY_DATABASE_URI = os.environ.get(
+    'SQLALCHEMY_DATABASE_URI',
+    'sqlite:///' + SQLALCHEMY_DATABASE_PATH,
+)
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+# SQLite (in SQLAlchemy 1.4) does not pool connections, so only configure the
+# pool for a database server
+SQLALCHEMY_ENGINE_OPTIONS = {}
+if not SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+    }
+
+CACHE_TYPE = os.environ.get('CACHE_TYPE', 'SimpleCache')
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+# course membership decides access, so only cache it if explicitly enabled;
+# this should only be set with a cache shared between workers (eg. RedisCache)
+CACHE_MEMBERSHIP = os.environ.get('CACHE_MEMBERSHIP', '').lower() in ('1', 'true', 'yes')
 
 SUBMISSION_PATH = APP_PATH / 'submissions'
 SUBMISSION_PATH.mkdir(exist_ok=True)